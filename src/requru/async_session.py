@@ -0,0 +1,236 @@
+import asyncio
+import logging
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from .proxy_provider import ProxyProvider
+from .session import IDEMPOTENT_METHODS, ProxyConfig, RetryConfig
+
+try:
+    import aiohttp
+except ImportError:  # optional, installed with the "async" extra
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSession:
+    """
+    asyncio counterpart of :class:`Session`. Requests are sent with aiohttp,
+    so many of them can wait on the network and on retry backoffs at the same
+    time on a single thread. Proxies are passed per request rather than stored
+    on the session, as concurrent requests may be using different ones.
+
+    Responses are returned as :class:`requests.Response` objects, so the same
+    :class:`RetryConfig` success predicate works for both sessions.
+    """
+
+    def __init__(
+        self,
+        proxy_config: ProxyConfig = ProxyConfig(),
+        retry_config: RetryConfig = RetryConfig(),
+        max_concurrency: int = 10,
+    ) -> None:
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncSession requires aiohttp. Install it with requru[async]"
+            )
+        self.proxy_config = proxy_config
+        self.retry_config = retry_config
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # created lazily, as aiohttp sessions must be created inside the loop
+        self._aio: aiohttp.ClientSession | None = None
+        self._successful_requests = 0
+        self._frozen_proxy: str | None = None
+        for provider in self.proxy_config.providers:
+            provider.prefetch()
+
+    async def _send(
+        self, method: str, url: str, proxy: str | None, kwargs: dict
+    ) -> Response | None:
+        if self._aio is None:
+            self._aio = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, ssl=False)
+            )
+        try:
+            async with self._aio.request(
+                method, url, proxy=proxy or None, **kwargs
+            ) as aio_response:
+                response = Response()
+                response.status_code = aio_response.status
+                response.reason = aio_response.reason
+                response.headers = CaseInsensitiveDict(aio_response.headers)
+                response.url = str(aio_response.url)
+                response.encoding = aio_response.charset
+                response._content = await aio_response.read()
+                # There is no raw stream: iter_content serves _content instead
+                response._content_consumed = True
+                return response
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not self._can_retry_after_exception(method, e):
+                raise
+            logger.warning(
+                "%s encountered using proxy %s: %s", e.__class__.__name__, proxy, e
+            )
+            return None
+
+    def _can_retry_after_exception(self, method: str, exception: Exception) -> bool:
+        """
+        Counterpart of :meth:`Session.can_retry_after_exception`. Only a
+        failure to connect is known to have happened before the request was
+        sent; after a disconnect or a timeout the server may have acted on it.
+        """
+        return (
+            isinstance(exception, aiohttp.ClientConnectorError)
+            or method.upper() in IDEMPOTENT_METHODS
+            or self.retry_config.retry_non_idempotent_requests
+        )
+
+    def _register_successful_response(self, url: str, response: Response, proxy: str):
+        self._successful_requests += 1
+        logger.debug(
+            "Request to %s successful with status code %s. Successful requests in session: %s",
+            url,
+            response.status_code,
+            self._successful_requests,
+        )
+        if (
+            self._successful_requests == 1
+            and self.proxy_config.freeze_after_first_successful_request
+        ):
+            logger.debug(
+                "First successful request. Freezing proxy %s for future requests", proxy
+            )
+            self._frozen_proxy = proxy
+
+    def _is_successful_response(self, response: Response | None) -> bool:
+        return response is not None and self.retry_config.is_successful_response(
+            response
+        )
+
+    async def _request_with_provider(
+        self, provider: ProxyProvider, method: str, url: str, kwargs: dict, tries: int
+    ) -> tuple[Response | None, int, bool]:
+        """
+        Coroutine version of :meth:`Session.request_with_provider`. The try
+        count is threaded through instead of being kept on the session, so
+        concurrent requests do not share it.
+        :return: the last response, the updated try count, and whether the
+        provider was exhausted
+        """
+        response: Response | None = None
+        provider_tries = 0
+        # Providers may block, e.g. Nordvpn fetching its pool on a cold start
+        proxy = await asyncio.to_thread(provider.get_new_proxy)
+        while provider_tries < provider.max_tries_per_request:
+            response = await self._send(method, url, proxy, kwargs)
+            provider_tries += 1
+            tries += 1
+            success = self._is_successful_response(response)
+            if success:
+                self._register_successful_response(url, response, proxy)
+            if (
+                not self.retry_config.retry_on_failure
+                or tries >= self.retry_config.max_tries
+                or success
+                or not self.retry_config.should_retry_response(response)
+            ):
+                return response, tries, False
+            if provider_tries >= provider.max_tries_per_request:
+                break
+            if (
+                self._frozen_proxy is None
+                and provider.should_get_new_proxy_after_failed_request()
+            ):
+                proxy = await asyncio.to_thread(provider.get_new_proxy)
+            await asyncio.sleep(
+                self.retry_config.get_backoff_seconds(response, provider_tries)
+            )
+        return response, tries, True
+
+    async def _request_with_providers(
+        self, method: str, url: str, kwargs: dict
+    ) -> Response | None:
+        response: Response | None = None
+        tries = 0
+        for provider in self.proxy_config.providers:
+            response, tries, exhausted = await self._request_with_provider(
+                provider, method, url, kwargs, tries
+            )
+            if not exhausted:
+                return response
+        return response
+
+    async def _request_with_proxy(
+        self, method: str, url: str, proxy: str | None, kwargs: dict
+    ) -> Response | None:
+        response: Response | None = None
+        for attempt in range(1, self.retry_config.max_tries + 1):
+            response = await self._send(method, url, proxy, kwargs)
+            if (
+                not self.retry_config.retry_on_failure
+                or self._is_successful_response(response)
+                or not self.retry_config.should_retry_response(response)
+            ):
+                return response
+            if attempt < self.retry_config.max_tries:
+                await asyncio.sleep(
+                    self.retry_config.get_backoff_seconds(response, attempt)
+                )
+        logger.debug(
+            "Exhausted all tries. Last response status code: %s",
+            response.status_code if response is not None else None,
+        )
+        return response
+
+    async def request(self, method: str, url: str, **kwargs) -> Response | None:
+        """
+        Send a request, retrying through the configured proxy providers.
+        :param method: method for the request
+        :param url: URL for the request
+        :param kwargs: optional arguments that ``aiohttp.ClientSession.request``
+            takes. ``proxy`` can only be given when no proxy providers are set.
+        :rtype: requests.Response
+        """
+        if "proxy" in kwargs and self.proxy_config.providers:
+            raise ValueError(
+                "Cannot specify both proxy and proxy_providers at the same time"
+            )
+        async with self._semaphore:
+            if self.proxy_config.providers and self._frozen_proxy is None:
+                return await self._request_with_providers(method, url, kwargs)
+            proxy = kwargs.pop("proxy", self._frozen_proxy)
+            return await self._request_with_proxy(method, url, proxy, kwargs)
+
+    async def get(self, url: str, **kwargs) -> Response | None:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, data=None, json=None, **kwargs) -> Response | None:
+        return await self.request("POST", url, data=data, json=json, **kwargs)
+
+    async def get_many(
+        self, urls: list[str], **kwargs
+    ) -> list[Response | None | BaseException]:
+        """
+        GET every url concurrently, at most max_concurrency at a time.
+        Results are in the same order as urls; a request that raised is
+        returned as its exception instead of cancelling the others.
+        """
+        return await asyncio.gather(
+            *(self.get(url, **kwargs) for url in urls), return_exceptions=True
+        )
+
+    async def close(self) -> None:
+        if self._aio is not None:
+            await self._aio.close()
+            self._aio = None
+        for provider in self.proxy_config.providers:
+            await asyncio.to_thread(provider.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
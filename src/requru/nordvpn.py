@@ -1,20 +1,52 @@
+import itertools
+import logging
 import os
 import random
 import requests
+import socket
+import threading
 import time
 
+from concurrent.futures import ThreadPoolExecutor
 from json import JSONDecodeError
+from operator import itemgetter
+from requests.adapters import HTTPAdapter
+from urllib3.util import connection as urllib3_connection
 
 from .proxy_provider import ProviderParadigm, ProxyProvider
 
+logger = logging.getLogger(__name__)
+
+try:
+    import ijson
+except ImportError:  # optional, installed with the "stream" extra
+    ijson = None
+
+_JSON_ERRORS = (
+    (JSONDecodeError,) if ijson is None else (JSONDecodeError, ijson.JSONError)
+)
+
+
+def _build_http() -> requests.Session:
+    http = requests.Session()
+    http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
+    return http
+
+
+# Shared across refreshes so the NordVPN API connection is kept alive
+_http = _build_http()
+
 
 class Nordvpn(ProxyProvider):
     strength = 0.2
-    _index = 0
     updated_at = 0
+    # Seconds the server pool is kept, measured on the monotonic clock
     TTL = 3600
+    # Seconds before a failed background refresh is tried again
+    REFRESH_RETRY_SECONDS = 60
     API_URL = "https://api.nordvpn.com/v1/servers/recommendations?filters[country_id]=43,179&filters[servers_groups][identifier]=legacy_standard&filters[servers_technologies][identifier]=proxy_ssl&limit=15"
     proxy_domains = []
+    _proxy_url_iter = iter(())
     DEFAULT_PORT = 89
     USER = os.getenv("NORDVPN_USER")
     PASSWORD = os.getenv("NORDVPN_PASSWORD")
@@ -28,46 +60,184 @@ class Nordvpn(ProxyProvider):
         "ar58.nordvpn.com",
     ]
     paradigm = ProviderParadigm.DIRECT
+    # Guards pool publication and the background refresh flag
+    _lock = threading.Lock()
+    # Held during a cold start so concurrent callers wait for a single fetch
+    _cold_start_lock = threading.Lock()
+    _refreshing = False
+    # hostname -> IPv4 address for the current pool, rebuilt on every refresh
+    _dns_cache: dict[str, str] = {}
 
     def __init__(self, max_tries_per_request: int = 10) -> None:
         self.max_tries_per_request = max_tries_per_request
 
     @staticmethod
-    def get_best_server_domains(min_load: int = 1, max_load: int = 60):
-        if (
-            not Nordvpn.proxy_domains
-            or (time.time() - Nordvpn.updated_at) > Nordvpn.TTL
-        ):
-            try:
-                resp = requests.get(Nordvpn.API_URL).json()
-                filtered_servers = [
-                    s
-                    for s in resp
-                    if s["status"] == "online" and min_load <= s["load"] <= max_load
+    def fetch_server_domains(min_load: int = 1, max_load: int = 60) -> list[str]:
+        try:
+            with _http.get(Nordvpn.API_URL, stream=True, timeout=5) as r:
+                if ijson is None:
+                    servers = r.json()
+                else:
+                    # Parse servers one by one as they arrive instead of
+                    # materializing the whole response first
+                    r.raw.decode_content = True
+                    servers = ijson.items(r.raw, "item")
+                get_fields = itemgetter("status", "load", "hostname")
+                proxy_domains = [
+                    hostname
+                    for status, load, hostname in map(get_fields, servers)
+                    if status == "online" and min_load <= load <= max_load
                 ]
-                Nordvpn.proxy_domains = [s["hostname"] for s in filtered_servers]
-
-            except JSONDecodeError:
-                print(
-                    "JSONDecodeError when fetching updated server list. Falling back to hardcoded list"
-                )
-                Nordvpn.proxy_domains = Nordvpn.EXAMPLE_PROXY_URLS
-            finally:
-                random.shuffle(Nordvpn.proxy_domains)
-                print(f"Pool now has {len(Nordvpn.proxy_domains)} servers")
-                Nordvpn.updated_at = time.time()
-                Nordvpn._index = 0
+        except _JSON_ERRORS as e:
+            logger.warning(
+                "%s when fetching updated server list. Falling back to hardcoded list",
+                e.__class__.__name__,
+            )
+            proxy_domains = Nordvpn.EXAMPLE_PROXY_URLS
+        if not proxy_domains:
+            logger.warning(
+                "No online server within load %s-%s. Falling back to hardcoded list",
+                min_load,
+                max_load,
+            )
+            proxy_domains = Nordvpn.EXAMPLE_PROXY_URLS
+        # Shuffled into a new list, so the hardcoded fallback is never mutated
+        return random.sample(proxy_domains, k=len(proxy_domains))
+
+    @staticmethod
+    def resolve_server_domains(proxy_domains: list[str]) -> dict[str, str]:
+        def resolve(host: str) -> str | None:
+            try:
+                return socket.gethostbyname(host)
+            except OSError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            addresses = executor.map(resolve, proxy_domains)
+            return {
+                host: address
+                for host, address in zip(proxy_domains, addresses)
+                if address is not None
+            }
+
+    @staticmethod
+    def refresh_server_domains(min_load: int = 1, max_load: int = 60):
+        """
+        Fetch a new server pool and swap it in. The new list is fully built
+        before being published, so readers never see a partial pool.
+        """
+        proxy_domains = Nordvpn.fetch_server_domains(min_load, max_load)
+        dns_cache = Nordvpn.resolve_server_domains(proxy_domains)
+        proxy_urls = [
+            f"https://{Nordvpn.USER}:{Nordvpn.PASSWORD}@{host}:{Nordvpn.DEFAULT_PORT}"
+            for host in proxy_domains
+        ]
+        # proxy_domains is published last: a non-empty pool is what
+        # lock-free readers take as the signal that the rest is ready
+        with Nordvpn._lock:
+            Nordvpn._proxy_url_iter = itertools.cycle(proxy_urls)
+            Nordvpn._dns_cache = dns_cache
+            Nordvpn.updated_at = time.monotonic()
+            Nordvpn.proxy_domains = proxy_domains
+        logger.debug("Pool now has %s servers", len(proxy_domains))
+
+    @staticmethod
+    def refresh_in_background(min_load: int = 1, max_load: int = 60):
+        """
+        Refresh the server pool from a background thread, where an error
+        would otherwise only reach threading.excepthook. On failure the
+        current pool keeps being served and the refresh is retried after
+        REFRESH_RETRY_SECONDS instead of on every call.
+        """
+        try:
+            Nordvpn.refresh_server_domains(min_load, max_load)
+        except Exception as e:
+            logger.warning(
+                "Could not refresh server list, keeping the current one: %r", e
+            )
+            Nordvpn.updated_at = (
+                time.monotonic() - Nordvpn.TTL + Nordvpn.REFRESH_RETRY_SECONDS
+            )
+        finally:
+            # Only cleared once updated_at has moved, so no caller sees an
+            # expired pool with no refresh running meanwhile
+            Nordvpn._refreshing = False
+
+    @staticmethod
+    def get_best_server_domains(min_load: int = 1, max_load: int = 60):
+        """
+        Make sure there is a server pool to pick from. Only a cold start blocks
+        on the NordVPN API; an expired pool keeps being served while a
+        background thread fetches its replacement.
+        """
+        if not Nordvpn.proxy_domains:
+            with Nordvpn._cold_start_lock:
+                if not Nordvpn.proxy_domains:
+                    Nordvpn.refresh_server_domains(min_load, max_load)
+            return
+        if (time.monotonic() - Nordvpn.updated_at) <= Nordvpn.TTL:
+            return
+        with Nordvpn._lock:
+            if Nordvpn._refreshing:
+                return
+            Nordvpn._refreshing = True
+        threading.Thread(
+            target=Nordvpn.refresh_in_background,
+            args=(min_load, max_load),
+            daemon=True,
+        ).start()
+
+    @staticmethod
+    def _prefetch_pool():
+        try:
+            Nordvpn.get_best_server_domains()
+        except Exception as e:
+            # The next request fetches again and raises to its caller
+            logger.warning("Could not prefetch server list: %r", e)
+
+    def prefetch(self):
+        if not Nordvpn.proxy_domains:
+            # Holds the cold start lock while fetching, so a request arriving
+            # meanwhile waits for this fetch instead of starting another one
+            threading.Thread(target=Nordvpn._prefetch_pool, daemon=True).start()
 
     @staticmethod
     def get_new_proxy() -> str:
         Nordvpn.get_best_server_domains()
-        host = Nordvpn.proxy_domains[Nordvpn._index]
-        print(f"Using server {host}")
-        Nordvpn._index = (Nordvpn._index + 1) % len(Nordvpn.proxy_domains)
-        proxy_url = (
-            f"https://{Nordvpn.USER}:{Nordvpn.PASSWORD}@{host}:{Nordvpn.DEFAULT_PORT}"
-        )
-        return proxy_url
+        proxy = next(Nordvpn._proxy_url_iter, None)
+        if proxy is None:
+            # A StopIteration would end the generator of the calling session
+            raise RuntimeError("No NordVPN server available")
+        return proxy
 
     def should_get_new_proxy_after_failed_request(self) -> bool:
         return True
+
+
+_urllib3_create_connection = urllib3_connection.create_connection
+
+
+def _create_connection(address, *args, **kwargs):
+    """Connect to pool servers through their pre-resolved address, skipping
+    the per-host DNS lookup. Any other host is resolved as usual."""
+    host, port = address
+    return _urllib3_create_connection(
+        (Nordvpn._dns_cache.get(host, host), port), *args, **kwargs
+    )
+
+
+urllib3_connection.create_connection = _create_connection
+
+
+def _reset_after_fork():
+    # A lock held by a thread of the parent at fork time (e.g. a prefetch
+    # started by a session) would never be released in the child, and pooled
+    # sockets would be shared with the parent
+    global _http
+    _http = _build_http()
+    Nordvpn._lock = threading.Lock()
+    Nordvpn._cold_start_lock = threading.Lock()
+    Nordvpn._refreshing = False
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
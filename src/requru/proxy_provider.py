@@ -13,6 +13,11 @@ class ProxyProvider:
     def get_new_proxy() -> str:
         return ""
 
+    def prefetch(self):
+        # Start any slow setup get_new_proxy needs in the background, so it is
+        # not paid by the first request. Called when a session is created.
+        pass
+
     def close(self):
         pass
 
@@ -1,14 +1,29 @@
+import itertools
+import logging
 import os
 import requests
-from dataclasses import dataclass, asdict, field
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from requests.adapters import HTTPAdapter
 from uuid import uuid4
 
 from .proxy_provider import ProviderParadigm, ProxyProvider
 
+logger = logging.getLogger(__name__)
+
+
+def _build_http() -> requests.Session:
+    http = requests.Session()
+    http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
+    return http
+
+
+# Shared by stats and release calls so connections are kept alive between them
+_http = _build_http()
+
 
 @dataclass
 class ProxyrackOptions:
-
     """Options that are specified next to the Proxyrack user.
     They must be in camelCase, as that is how Proxyrack expects them."""
 
@@ -23,8 +38,8 @@ class ProxyrackProvider(ProxyProvider):
     API_KEY = os.getenv("PROXYRACK_API_KEY")
     DNS = "premium.residential.proxyrack.net"
     random_port = 9000
-    sticky_ports = [i for i in range(10000, 14000)]
-    _sticky_ports_index = 0
+    sticky_ports = tuple(range(10000, 14000))
+    _sticky_ports_iter = itertools.cycle(sticky_ports)
     paradigm = ProviderParadigm.DNS
 
     def __init__(
@@ -39,43 +54,74 @@ class ProxyrackProvider(ProxyProvider):
         self.options = options
         self.force_port = force_port
         self._proxies: list[str] = []
-
-    def get_new_proxy(self) -> str:
-        options_dict = asdict(self.options)
+        # Options are rendered once, as they do not change for the provider
+        options_dict = vars(self.options)
         option_str = "-".join(
             [f"{k}-{v}" for k, v in options_dict.items() if v is not None]
         )
-        if option_str:
-            final_option_str = f"-{option_str}"
+        self._option_str = f"-{option_str}" if option_str else ""
+        # Only the port changes between proxies. Credentials are escaped so a
+        # literal "%" in them survives the formatting.
+        url = f"http://{ProxyrackProvider.USER}{self._option_str}:{ProxyrackProvider.API_KEY}@{ProxyrackProvider.DNS}"
+        self._url_template = url.replace("%", "%%") + ":%d"
 
+    def get_new_proxy(self) -> str:
         if self.force_port:
-            print("WARNING: Using forced port")
+            logger.warning("Using forced port %s", self.force_port)
             port = self.force_port
         elif self.use_sticky_ports:
-            port = ProxyrackProvider.sticky_ports[ProxyrackProvider._sticky_ports_index]
-            ProxyrackProvider._sticky_ports_index = (
-                ProxyrackProvider._sticky_ports_index + 1
-            ) % len(ProxyrackProvider.sticky_ports)
+            port = next(ProxyrackProvider._sticky_ports_iter)
         else:
             port = ProxyrackProvider.random_port
 
-        proxy = f"http://{ProxyrackProvider.USER}{final_option_str}:{ProxyrackProvider.API_KEY}@{ProxyrackProvider.DNS}:{port}"
-        print(f"Using {'sticky' if self.use_sticky_ports else 'random'} proxy {proxy}")
+        proxy = self._url_template % port
+        logger.debug(
+            "Using %s proxy %s", "sticky" if self.use_sticky_ports else "random", proxy
+        )
         self._proxies.append(proxy)
         return proxy
 
     def should_get_new_proxy_after_failed_request(self) -> bool:
         return self.use_sticky_ports
 
+    @staticmethod
+    def release(proxy: str):
+        try:
+            _http.get(
+                "http://api.proxyrack.net/release", proxies={"http": proxy}, timeout=5
+            )
+        except requests.RequestException as e:
+            logger.warning("Could not release proxy %s: %s", proxy, e)
+        else:
+            logger.debug("Released proxy %s", proxy)
+        finally:
+            # Every sticky proxy gets its own connection pool, which would
+            # otherwise stay open for the life of the process
+            proxy_manager = _http.adapters["http://"].proxy_manager.pop(proxy, None)
+            if proxy_manager is not None:
+                proxy_manager.clear()
+
     def close(self):
-        if self.use_sticky_ports:
-            for proxy in self._proxies:
-                r = requests.get(
-                    f"http://api.proxyrack.net/release", proxies={"http": proxy}
-                )
-                print(f"Released proxy {self._proxies}")
+        if self.use_sticky_ports and self._proxies:
+            # Releases are independent, so they are sent concurrently rather
+            # than paying one round trip per sticky proxy at teardown
+            proxies = list(dict.fromkeys(self._proxies))
+            self._proxies.clear()
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                list(executor.map(ProxyrackProvider.release, proxies))
 
     @staticmethod
     def get_stats(proxy: str) -> dict:
-        r = requests.get(f"http://api.proxyrack.net/stats", proxies={"http": proxy})
+        r = _http.get(
+            "http://api.proxyrack.net/stats", proxies={"http": proxy}, timeout=5
+        )
         return r.json()
+
+
+def _reset_after_fork():
+    # Pooled sockets would otherwise be shared with the parent process
+    global _http
+    _http = _build_http()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,13 +1,17 @@
+import logging
+
 from requru.proxyrack import ProxyrackProvider
 from requru.nordvpn import Nordvpn
 from .session import Session
 
+logger = logging.getLogger(__name__)
+
 
 def _pop_session_kwargs(kwargs: dict) -> dict:
     # Pop session kwargs
     session_kwargs = {
         session_kwarg_key: kwargs.pop(session_kwarg_key, None)
-        for session_kwarg_key in ("proxy_config", "retry_config")
+        for session_kwarg_key in ("proxy_config", "retry_config", "cache")
     }
     # Clean None values
     session_kwargs = {
@@ -20,7 +24,7 @@ def _pop_session_kwargs(kwargs: dict) -> dict:
 
 def request(method, url, **kwargs):
     session_kwargs = _pop_session_kwargs(kwargs)
-    print(f"kwargs after pop: {kwargs}")
+    logger.debug("kwargs after pop: %s", kwargs)
     with Session(**session_kwargs) as session:
         return session.request(method=method, url=url, **kwargs)
 
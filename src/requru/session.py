@@ -1,41 +1,231 @@
-from collections.abc import Callable
+from collections import OrderedDict
+from collections.abc import Callable, Generator, MutableMapping
 
+import heapq
+import logging
+import multiprocessing
+import multiprocessing.pool
+import random
 import requests
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass, field
-from enum import StrEnum
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import Enum, StrEnum, auto
 from typing import Union
-from requests.models import Response
+from requests.models import PreparedRequest, Request, Response
 from requests.exceptions import (
     SSLError,
     ProxyError,
     ChunkedEncodingError,
     ConnectionError,
+    ConnectTimeout,
+    UnrewindableBodyError,
 )
+from requests.utils import rewind_body
 from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
 
 from .proxy_provider import ProxyProvider, ProviderParadigm
 from .proxyrack import ProxyrackProvider
 from .nordvpn import Nordvpn
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"})
+# Raised before any of the request reached the server, so always safe to retry
+_PRE_SEND_ERRORS = (ConnectTimeout, ProxyError, SSLError)
+# Failures of the connection rather than of the request. SSLError and the
+# other pre-send errors are among them.
+_CONNECTION_ERRORS = (ConnectionError, ChunkedEncodingError)
+
+
+class AttemptOutcome(Enum):
+    # The response is successful and is returned
+    SUCCESS = auto()
+    # The response is unsuccessful and is not worth retrying, or cannot be
+    GIVE_UP = auto()
+    # The request is sent again after a backoff
+    RETRY = auto()
+
+
+def _failed_before_sending(exception: Exception) -> bool:
+    if isinstance(exception, _PRE_SEND_ERRORS):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the root cause
+    reason = getattr(exception.args[0] if exception.args else None, "reason", None)
+    return isinstance(reason, NewConnectionError)
+
+
+def _body_stream(request_kwargs: dict):
+    """The file-like object or iterator the prepared request body is read
+    from, or None if the body was encoded up front (e.g. multipart files)."""
+    body = request_kwargs["prepared"][0].body
+    return body if hasattr(body, "read") or hasattr(body, "__next__") else None
+
+
+def _rewind_body(request_kwargs: dict) -> bool:
+    """Seek the stream the request body is read from back to where it was
+    when the request was prepared, so a retry sends the whole body again.
+    False if it cannot be rewound."""
+    if _body_stream(request_kwargs) is None:
+        return True
+    try:
+        rewind_body(request_kwargs["prepared"][0])
+    except UnrewindableBodyError:
+        return False
+    return True
+
+
+@dataclass(slots=True)
 class ProxyConfig:
     providers: list[ProxyProvider] = field(
         default_factory=lambda: [ProxyrackProvider()]
     )
     freeze_after_first_successful_request: bool = False
     # TODO: freeze should not be used with DNS providers using random ports. Validate.
+    # Send the first attempt through every provider at once and keep the first
+    # successful response instead of trying providers one after the other.
+    race_providers: bool = False
+
+    def __setattr__(self, name, value):
+        # Strength is fixed per provider class, so providers are sorted,
+        # strongest first, whenever they are set instead of on every request
+        if name == "providers":
+            value = sorted(value, key=lambda p: p.strength, reverse=True)
+        # Not super(): slots=True rebuilds the class, which breaks its
+        # zero-argument form
+        object.__setattr__(self, name, value)
+
+
+def _retry_after_seconds(response: Response) -> float | None:
+    """Seconds requested by the Retry-After header, given either as a number
+    of seconds or as an HTTP date. None if absent or unparseable."""
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _discard(response: Response | None):
+    """Close a response that will not be returned. A body left unread is
+    dropped along with its connection instead of being downloaded."""
+    if response is not None:
+        response.close()
+
+
+def _discard_race_response(future: Future):
+    """Done callback closing the response of a race attempt that lost."""
+    if not future.cancelled() and future.exception() is None:
+        _discard(future.result()[2])
+
 
+def _advance(steps: Generator) -> tuple[bool, object]:
+    """Run a request generator up to its next backoff. Returns whether it
+    finished, and either the response or the seconds to wait."""
+    try:
+        return False, next(steps)
+    except StopIteration as stop:
+        return True, stop.value
 
-@dataclass
+
+def _default_success(response: Response) -> bool:
+    # Identified by identity, see RetryConfig.checks_status_only and
+    # Session.classify_attempt. Keep them in sync when changing it.
+    return 200 <= response.status_code < 300
+
+
+@dataclass(slots=True)
 class RetryConfig:
     retry_on_failure: bool = True
     backoff_seconds: int = 30
     max_tries: int = 3
-    is_successful_response: Callable[[Response], bool] = (
-        lambda _r: 200 <= _r.status_code < 300
+    # Module level function rather than a lambda so that sessions pickle
+    is_successful_response: Callable[[Response], bool] = _default_success
+    max_backoff_seconds: int = 120
+    # Retry POST/PATCH requests whose connection failed after they may have
+    # reached the server. Only safe if the endpoint tolerates duplicates.
+    retry_non_idempotent_requests: bool = False
+    # Error status codes worth retrying. Any other error status (e.g. 400,
+    # 404) is returned at once, while a 2xx/3xx response rejected by
+    # is_successful_response (e.g. a block page) is always retried. 403 and
+    # 407 are included as they usually mean the proxy was blocked or refused,
+    # which a new proxy can fix. None retries every unsuccessful response.
+    retry_statuses: frozenset[int] | None = frozenset(
+        {403, 407, 408, 425, 429, 500, 502, 503, 504}
     )
+    # Set when a custom is_successful_response only reads the status code.
+    # Bodies of responses that are going to be retried are then never
+    # downloaded. Implied for the default predicate.
+    status_only_success_check: bool = False
+
+    def checks_status_only(self) -> bool:
+        return (
+            self.status_only_success_check
+            or self.is_successful_response is _default_success
+        )
+
+    def should_retry_response(self, response: Response | None) -> bool:
+        """
+        Determine whether an unsuccessful response is worth retrying. A missing
+        response (connection failure) and a response rejected despite a non
+        error status always are.
+        """
+        return (
+            response is None
+            or response.status_code < 400
+            or self.retry_statuses is None
+            or response.status_code in self.retry_statuses
+        )
+
+    def get_backoff_seconds(self, response: Response | None, attempt: int) -> float:
+        """
+        Seconds to wait before retrying after a failed attempt. A Retry-After
+        header on the response is honoured. Otherwise the wait is drawn
+        uniformly between zero and an exponential cap (full jitter): the cap
+        starts at backoff_seconds and doubles with every attempt up to
+        max_backoff_seconds, so sessions failing together spread their
+        retries over the whole window instead of retrying together.
+        :param response: the failed response, or None if no response was received
+        :param attempt: number of attempts made so far, starting at 1
+        """
+        retry_after = _retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff_seconds)
+        backoff = self.backoff_seconds * 2 ** (attempt - 1)
+        return random.uniform(0, min(backoff, self.max_backoff_seconds))
+
+
+# Optional arguments of Session.request, for requests built from plain kwargs
+_REQUEST_DEFAULTS = dict(
+    params=None,
+    data=None,
+    headers=None,
+    cookies=None,
+    files=None,
+    auth=None,
+    timeout=None,
+    allow_redirects=True,
+    proxies=None,
+    hooks=None,
+    stream=None,
+    verify=None,
+    cert=None,
+    json=None,
+)
 
 
 class Session(requests.Session):
@@ -43,22 +233,64 @@ class Session(requests.Session):
         self,
         proxy_config: ProxyConfig = ProxyConfig(),
         retry_config: RetryConfig = RetryConfig(),
+        cache: MutableMapping | None = None,
     ) -> None:
+        """
+        :param cache: (optional) mapping in which successful GET and HEAD
+            responses are stored and served from, e.g. a dict, an LRU cache or
+            a ``diskcache.Cache`` to share responses between runs.
+        """
         super().__init__()
         self.proxy_config = proxy_config
         self.retry_config = retry_config
+        self.cache = cache
         self.verify = False
         self._successful_requests = 0
-        self._tries: int = 0
         self._proxies_frozen: bool = False
-        # current request params. Set by request method
-        self._super_request_params: tuple = ()
+        # Requests start with the provider that last succeeded and leave the
+        # one that last ran out of tries for the end
+        self._last_successful_provider: ProxyProvider | None = None
+        self._last_exhausted_provider: ProxyProvider | None = None
+        self._lock = threading.Lock()
         self.reset_adapters()
+        for provider in self.proxy_config.providers:
+            provider.prefetch()
+
+    @staticmethod
+    def build_adapter() -> HTTPAdapter:
+        # Large pools keep connections (and proxy tunnels) alive across
+        # concurrent requests. urllib3 does not retry: retries are handled
+        # here, through the proxy providers.
+        return HTTPAdapter(
+            pool_connections=64,
+            pool_maxsize=64,
+            pool_block=False,
+            max_retries=Retry(total=0),
+        )
 
     def reset_adapters(self):
-        self.adapters.clear()
-        self.mount("https://", HTTPAdapter(max_retries=3))
-        self.mount("http://", HTTPAdapter(max_retries=3))
+        # Swapped in whole, so concurrent requests never see an empty mapping
+        self.adapters = OrderedDict(
+            [("https://", self.build_adapter()), ("http://", self.build_adapter())]
+        )
+
+    def discard_proxy_connections(self, proxy: str):
+        """
+        Drop the pooled connections going through a single proxy. Adapters
+        keep one connection pool per proxy URL, so connections through every
+        other proxy stay alive and are reused when rotating back to them.
+        :param proxy: proxy URL whose connections are dropped
+        """
+        for adapter in self.adapters.values():
+            proxy_manager = getattr(adapter, "proxy_manager", {}).pop(proxy, None)
+            if proxy_manager is not None:
+                proxy_manager.clear()
+
+    def reset_connections(self, proxy: str | None):
+        if proxy:
+            self.discard_proxy_connections(proxy)
+        else:
+            self.reset_adapters()
 
     def should_get_new_proxy_after_failed_request(self, provider: ProxyProvider):
         """
@@ -74,81 +306,356 @@ class Session(requests.Session):
             and provider.should_get_new_proxy_after_failed_request()
         )
 
-    def try_super_request_and_handle_exceptions(self):
+    def can_retry_after_exception(
+        self, request_kwargs: dict, exception: Exception
+    ) -> bool:
+        """
+        Determine whether a request whose connection failed can be sent again.
+        Failures before anything was sent always can. Otherwise the server may
+        already have acted on the request, so it is only repeated if its
+        method is idempotent or the retry config allows any method.
+        """
+        return (
+            _failed_before_sending(exception)
+            or request_kwargs["method"].upper() in IDEMPOTENT_METHODS
+            or self.retry_config.retry_non_idempotent_requests
+        )
+
+    def try_super_request_and_handle_exceptions(
+        self, request_kwargs: dict, proxy: str | None = None
+    ) -> Response | None:
+        """
+        Send a request once, returning None if the connection failed. If it
+        failed in a way that makes the request unsafe to repeat, the exception
+        is raised instead.
+        :param request_kwargs: arguments for requests.Session.request, along
+            with the request prepared from them by :meth:`prepare_send` under
+            ``"prepared"``
+        :param proxy: (optional) proxy to send the request through. It is
+            passed along with the request instead of being set on the session,
+            so concurrent requests can use different proxies.
+        """
+        prepared, settings = request_kwargs["prepared"]
+        proxies = settings["proxies"]
+        if proxy is not None:
+            proxies = {**proxies, "http": proxy, "https": proxy}
+        else:
+            proxy = proxies.get("https")
+        # The body is only read once the status shows it is needed, so
+        # failed attempts do not download error pages through the proxy
+        defer_body = not settings["stream"] and self.retry_config.checks_status_only()
         response: Response | None = None
         try:
-            response = super().request(*self._super_request_params)
-        except ConnectionError as e:
-            print(e)
-            print("ConnectionError encountered. Resetting adapters")
-            self.reset_adapters()
-        except ChunkedEncodingError as e:
-            print(e)
-            print("ChunkedEncodingError encountered. Resetting adapters")
-            self.reset_adapters()
+            # Every attempt sends a copy of the same prepared request, as
+            # requests.Session.send may add to it
+            response = self.send(
+                prepared.copy(),
+                proxies=proxies,
+                stream=defer_body or settings["stream"],
+                verify=settings["verify"],
+                cert=settings["cert"],
+                timeout=request_kwargs["timeout"],
+                allow_redirects=request_kwargs["allow_redirects"],
+            )
+            if defer_body and (
+                self.retry_config.is_successful_response(response)
+                or not self.retry_config.should_retry_response(response)
+            ):
+                response.content
+        except _CONNECTION_ERRORS as e:
+            if not self.can_retry_after_exception(request_kwargs, e):
+                raise
+            logger.warning("%s encountered: %s", e.__class__.__name__, e)
+            # urllib3 already discards a failed connection itself, but a
+            # broken TLS context would break every pooled connection too
+            if isinstance(e, SSLError):
+                self.reset_connections(proxy)
+            # A body that failed to download is not a response to judge
+            _discard(response)
+            response = None
         return response
 
-    def request_with_providers(self):
-        url = self._super_request_params[1]
-        print(f"Using {self.proxy_config.providers} as proxy providers")
-        sorted_providers: list[ProxyProvider] = sorted(
-            self.proxy_config.providers, key=lambda p: p.strength, reverse=True
+    def try_provider_once(
+        self, provider: ProxyProvider, request_kwargs: dict
+    ) -> tuple[ProxyProvider, str, Response | None]:
+        """
+        Send a request once through a new proxy from the provider.
+        :param provider: ProxyProvider instance from which the proxy is fetched
+        :param request_kwargs: arguments for requests.Session.request
+        :return: the provider, the proxy used and the response, or None if
+            the request failed
+        """
+        proxy = provider.get_new_proxy()
+        return (
+            provider,
+            proxy,
+            self.try_super_request_and_handle_exceptions(request_kwargs, proxy),
         )
-        print(f"Sorted providers: {sorted_providers}")
-        response: Response | None = None
-        for provider in sorted_providers:
-            provider_tries = 0
-            print(f"Trying provider {provider.__class__.__name__}")
-            print(f"Provider max tries: {provider.max_tries_per_request}")
 
-            print("Getting new proxy")
-            proxy = provider.get_new_proxy()
-            self.proxies.update({"http": proxy, "https": proxy})
-            print(f"Using proxy {proxy}")
-
-            while provider_tries < provider.max_tries_per_request:
-                print(f"Request attempt {self._tries + 1} to url {url}")
-                response = self.try_super_request_and_handle_exceptions()
-                provider_tries += 1
-                self._tries += 1
-                success = (
-                    self.retry_config.is_successful_response(response)
-                    if response is not None
-                    else False
-                )
-                if success:
-                    self._successful_requests += 1
-                    print(
-                        f"Request to {url} successful with status code {response.status_code}. Successful requests in session: {self._successful_requests}"
-                    )
+    def race_providers(
+        self, providers: list[ProxyProvider], request_kwargs: dict
+    ) -> tuple[Response | None, ProxyProvider | None, str | None, int]:
+        """
+        Try all providers concurrently and return the first successful
+        response, or the last response received if none of them succeeded.
+        :param providers: ProxyProvider instances to race
+        :param request_kwargs: arguments for requests.Session.request
+        :return: the response, the provider and proxy it came through, and
+            the number of tries made
+        """
+        executor = ThreadPoolExecutor(max_workers=len(providers))
+        futures = [
+            executor.submit(self.try_provider_once, provider, request_kwargs)
+            for provider in providers
+        ]
+        pending = set(futures)
+        collected = set()
+        response: Response | None = None
+        provider: ProxyProvider | None = None
+        proxy: str | None = None
+        tries = 0
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tries += 1
+                    _discard(response)
+                    collected.add(future)
+                    provider, proxy, response = future.result()
                     if (
-                        self._successful_requests == 1
-                        and self.proxy_config.freeze_after_first_successful_request
+                        response is not None
+                        and self.retry_config.is_successful_response(response)
                     ):
-                        print(
-                            f"First successful request. Freezing proxy {proxy} for future requests"
-                        )
-                        self._proxies_frozen = True
-                else:
-                    print(
-                        f"Response unsuccessful with status code {response.status_code if response is not None else None}"
-                    )
-                if (
-                    not self.retry_config.retry_on_failure
-                    or self._tries >= self.retry_config.max_tries
-                    or success
-                ):
-                    return response
-                elif self.should_get_new_proxy_after_failed_request(provider):
-                    print(f"Getting new proxy after unsusccessful request to {url}")
-                    proxy = provider.get_new_proxy()
-                    self.proxies.update({"http": proxy, "https": proxy})
-                    print(f"Using proxy {proxy}")
-                time.sleep(self.retry_config.backoff_seconds)
-            else:
-                print(
-                    f"Provider {provider.__class__.__name__} exhausted. Moving on to next provider"
+                        return response, provider, proxy, tries
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            # Losing attempts keep running; their responses are closed as
+            # they arrive so they do not hold their connections
+            for future in futures:
+                if future not in collected:
+                    future.add_done_callback(_discard_race_response)
+        return response, provider, proxy, tries
+
+    def register_successful_response(self, url: str, response: Response, proxy: str):
+        with self._lock:
+            self._successful_requests += 1
+            successful_requests = self._successful_requests
+        logger.debug(
+            "Request to %s successful with status code %s. Successful requests in session: %s",
+            url,
+            response.status_code,
+            successful_requests,
+        )
+        if (
+            successful_requests == 1
+            and self.proxy_config.freeze_after_first_successful_request
+        ):
+            logger.debug(
+                "First successful request. Freezing proxy %s for future requests", proxy
+            )
+            self.proxies.update({"http": proxy, "https": proxy})
+            self._proxies_frozen = True
+
+    def classify_attempt(
+        self, request_kwargs: dict, response: Response | None, tries: int
+    ) -> AttemptOutcome:
+        """
+        Decide what happens to a request after an attempt. Every retry loop
+        goes through here, so they all stop for the same reasons.
+        :param request_kwargs: arguments for requests.Session.request
+        :param response: the response, or None if the connection failed
+        :param tries: tries made for this request so far
+        """
+        retry_config = self.retry_config
+        is_successful_response = retry_config.is_successful_response
+        if response is not None and (
+            # The default predicate is inlined, saving a call per attempt
+            200 <= response.status_code < 300
+            if is_successful_response is _default_success
+            else is_successful_response(response)
+        ):
+            return AttemptOutcome.SUCCESS
+        logger.debug(
+            "Response unsuccessful with status code %s",
+            response.status_code if response is not None else None,
+        )
+        if not retry_config.retry_on_failure or not retry_config.should_retry_response(
+            response
+        ):
+            return AttemptOutcome.GIVE_UP
+        if tries >= retry_config.max_tries:
+            logger.debug("Exhausted all %s tries", tries)
+            return AttemptOutcome.GIVE_UP
+        if not _rewind_body(request_kwargs):
+            logger.warning("Request body cannot be sent again. Not retrying")
+            return AttemptOutcome.GIVE_UP
+        return AttemptOutcome.RETRY
+
+    def register_successful_provider(self, provider: ProxyProvider):
+        # Tried first by the next requests, see request_with_providers
+        self._last_successful_provider = provider
+        if self._last_exhausted_provider is provider:
+            self._last_exhausted_provider = None
+
+    def request_with_provider(
+        self, provider: ProxyProvider, request_kwargs: dict, tries: int
+    ) -> Generator[float, None, tuple[Response | None, int, bool]]:
+        """
+        Send a request through proxies from a single provider, retrying until
+        it succeeds, the request runs out of tries or the provider runs out of
+        tries. Yields the seconds to wait before every retry, see
+        :meth:`request_steps`.
+        :param provider: ProxyProvider instance from which proxies are fetched
+        :param request_kwargs: arguments for requests.Session.request
+        :param tries: tries already made for this request
+        :return: the last response, the updated number of tries, and whether
+            the provider was exhausted
+        """
+        url = request_kwargs["url"]
+        # Bound once, as they are read on every attempt
+        retry_config = self.retry_config
+        provider_max_tries = provider.max_tries_per_request
+        provider_name = provider.__class__.__name__
+        get_new_proxy = provider.get_new_proxy
+        response: Response | None = None
+        provider_tries = 0
+        logger.debug(
+            "Trying provider %s. Provider max tries: %s",
+            provider_name,
+            provider_max_tries,
+        )
+        proxy = get_new_proxy()
+        logger.debug("Using proxy %s", proxy)
+
+        while provider_tries < provider_max_tries:
+            logger.debug("Request attempt %s to url %s", tries + 1, url)
+            _discard(response)
+            response = self.try_super_request_and_handle_exceptions(
+                request_kwargs, proxy
+            )
+            provider_tries += 1
+            tries += 1
+            outcome = self.classify_attempt(request_kwargs, response, tries)
+            if outcome is AttemptOutcome.SUCCESS:
+                self.register_successful_response(url, response, proxy)
+                self.register_successful_provider(provider)
+            if outcome is not AttemptOutcome.RETRY:
+                return response, tries, False
+            if provider_tries >= provider_max_tries:
+                # The next provider takes over at once, with its own proxy
+                break
+            if self.should_get_new_proxy_after_failed_request(provider):
+                proxy = get_new_proxy()
+                logger.debug(
+                    "Using new proxy %s after unsuccessful request to %s",
+                    proxy,
+                    url,
                 )
+            yield retry_config.get_backoff_seconds(response, provider_tries)
+        logger.debug("Provider %s exhausted", provider_name)
+        self._last_exhausted_provider = provider
+        if self._last_successful_provider is provider:
+            self._last_successful_provider = None
+        return response, tries, True
+
+    def request_with_providers(
+        self, request_kwargs: dict
+    ) -> Generator[float, None, Response | None]:
+        providers = self.proxy_config.providers
+        if len(providers) == 1:
+            response, _, _ = yield from self.request_with_provider(
+                providers[0], request_kwargs, 0
+            )
+            return response
+
+        last_successful = self._last_successful_provider
+        last_exhausted = self._last_exhausted_provider
+        if last_successful is not None or last_exhausted is not None:
+            # Stable, so providers are otherwise still tried strongest first
+            providers = sorted(
+                providers,
+                key=lambda p: (p is not last_successful, p is last_exhausted),
+            )
+        url = request_kwargs["url"]
+        logger.debug("Using %s as proxy providers", providers)
+        response: Response | None = None
+        tries = 0
+        # Racing attempts would all read from the same body stream
+        if self.proxy_config.race_providers and _body_stream(request_kwargs) is None:
+            logger.debug("Racing providers for request to url %s", url)
+            response, provider, proxy, tries = self.race_providers(
+                providers, request_kwargs
+            )
+            outcome = self.classify_attempt(request_kwargs, response, tries)
+            if outcome is AttemptOutcome.SUCCESS:
+                self.register_successful_response(url, response, proxy)
+                self.register_successful_provider(provider)
+            if outcome is not AttemptOutcome.RETRY:
+                return response
+            yield self.retry_config.get_backoff_seconds(response, 1)
+        for provider in providers:
+            _discard(response)
+            response, tries, exhausted = yield from self.request_with_provider(
+                provider, request_kwargs, tries
+            )
+            if not exhausted:
+                return response
+            logger.debug("Moving on to next provider")
+        return response
+
+    def request_without_providers(
+        self, request_kwargs: dict
+    ) -> Generator[float, None, Response | None]:
+        """
+        Send a request through the session proxies (frozen, or none at all),
+        retrying until it succeeds or runs out of tries. Yields the seconds to
+        wait before every retry, see :meth:`request_steps`.
+        :param request_kwargs: arguments for requests.Session.request
+        """
+        logger.debug(
+            "Proxies frozen: %s. Proxies: %s", self._proxies_frozen, self.proxies
+        )
+        r: Response | None = None
+        tries = 0
+        while True:
+            _discard(r)
+            r = self.try_super_request_and_handle_exceptions(request_kwargs)
+            tries += 1
+            outcome = self.classify_attempt(request_kwargs, r, tries)
+            if outcome is not AttemptOutcome.RETRY:
+                return r
+            yield self.retry_config.get_backoff_seconds(r, tries)
+
+    @staticmethod
+    def get_cache_key(prepared: PreparedRequest) -> tuple | None:
+        """
+        Key under which the response to a request is cached, or None if the
+        request is not cacheable. Only GET and HEAD requests are cached, keyed
+        on method, url and headers as sent, so session params and headers are
+        accounted for. Requests carrying credentials (an Authorization or
+        Cookie header, including session auth and cookies) or asking for a
+        Range are never cached.
+        :param prepared: the request as prepared by :meth:`prepare_send`
+        """
+        if prepared.method not in ("GET", "HEAD"):
+            return None
+        headers = prepared.headers
+        if any(name in headers for name in ("Authorization", "Cookie", "Range")):
+            return None
+        return (
+            prepared.method,
+            prepared.url,
+            tuple(sorted((k.lower(), v) for k, v in headers.items())),
+        )
+
+    def is_cacheable_response(self, response: Response | None) -> bool:
+        return (
+            response is not None
+            and self.retry_config.is_successful_response(response)
+            and "no-store" not in response.headers.get("Cache-Control", "")
+            # a streamed body has not been read yet and can only be read once
+            and response._content_consumed
+        )
 
     def request(
         self,
@@ -168,6 +675,7 @@ class Session(requests.Session):
         verify=None,
         cert=None,
         json=None,
+        use_cache: bool = True,
     ) -> Response:
         """Constructs a :class:`Request <Request>`, prepares it and sends it.
         Returns :class:`Response <Response>` object.
@@ -208,56 +716,206 @@ class Session(requests.Session):
             may be useful during local development or testing.
         :param cert: (optional) if String, path to ssl client cert file (.pem).
             If Tuple, ('cert', 'key') pair.
+        :param use_cache: (optional) whether the session cache, if any, may
+            answer this request and store its response. Defaults to ``True``.
         :rtype: requests.Response
         """
-        super_request_params = (
-            method,
-            url,
-            params,
-            data,
-            headers,
-            cookies,
-            files,
-            auth,
-            timeout,
-            allow_redirects,
-            proxies,
-            hooks,
-            stream,
-            verify,
-            cert,
-            json,
+        request_kwargs = dict(
+            method=method,
+            url=url,
+            params=params,
+            data=data,
+            headers=headers,
+            cookies=cookies,
+            files=files,
+            auth=auth,
+            timeout=timeout,
+            allow_redirects=allow_redirects,
+            proxies=proxies,
+            hooks=hooks,
+            stream=stream,
+            verify=verify,
+            cert=cert,
+            json=json,
+        )
+        steps = self.request_steps(request_kwargs, use_cache)
+        while True:
+            finished, value = _advance(steps)
+            if finished:
+                return value
+            time.sleep(value)
+
+    @staticmethod
+    def read_deferred_body(response: Response) -> Response | None:
+        """
+        Read the body of a retryable response returned after running out of
+        tries, which was left unread in case it was retried. None if the
+        connection fails meanwhile, as if the attempt had failed.
+        """
+        if response._content_consumed:
+            return response
+        try:
+            response.content
+        except _CONNECTION_ERRORS as e:
+            logger.warning("%s encountered: %s", e.__class__.__name__, e)
+            return None
+        return response
+
+    def prepare_send(self, request_kwargs: dict) -> tuple[PreparedRequest, dict]:
+        """
+        Do the work requests.Session.request does before sending, once for all
+        attempts of a request: headers, cookies and auth are merged and the
+        body is encoded, and the proxies, stream, verify and cert settings are
+        resolved against the session and the environment.
+        :param request_kwargs: arguments for requests.Session.request
+        :return: the prepared request, and the settings to send it with
+        """
+        prepared = self.prepare_request(
+            Request(
+                method=request_kwargs["method"].upper(),
+                url=request_kwargs["url"],
+                headers=request_kwargs["headers"],
+                files=request_kwargs["files"],
+                data=request_kwargs["data"] or {},
+                json=request_kwargs["json"],
+                params=request_kwargs["params"] or {},
+                auth=request_kwargs["auth"],
+                cookies=request_kwargs["cookies"],
+                hooks=request_kwargs["hooks"],
+            )
+        )
+        settings = self.merge_environment_settings(
+            prepared.url,
+            request_kwargs["proxies"] or {},
+            request_kwargs["stream"],
+            request_kwargs["verify"],
+            request_kwargs["cert"],
         )
-        self._super_request_params = super_request_params
-        if proxies and self.proxy_config.providers:
+        return prepared, settings
+
+    def request_steps(
+        self, request_kwargs: dict, use_cache: bool = True
+    ) -> Generator[float, None, Response | None]:
+        """
+        Send a request with retries, without ever waiting. Every attempt runs
+        when the generator is advanced, and the seconds to wait before the
+        next one are yielded; the response is the generator's return value.
+        The caller decides how to wait, so a backoff does not have to block a
+        thread.
+        :param request_kwargs: arguments for requests.Session.request
+        :param use_cache: whether the session cache, if any, may answer this
+            request and store its response
+        """
+        if request_kwargs["proxies"] and self.proxy_config.providers:
             raise ValueError(
                 "Cannot specify both proxies and proxy_providers at the same time"
             )
-        self._tries = 0  # reset tries
-        r: Response | None = None
+        # Retries only differ in the proxy they are sent through
+        prepared, settings = self.prepare_send(request_kwargs)
+        request_kwargs = {**request_kwargs, "prepared": (prepared, settings)}
+        cache_key = (
+            self.get_cache_key(prepared)
+            if use_cache and self.cache is not None
+            else None
+        )
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Returning cached response for %s", prepared.url)
+                return cached
 
         if self.proxy_config.providers and not self._proxies_frozen:
-            r = self.request_with_providers()
+            r = yield from self.request_with_providers(request_kwargs)
         else:
-            print(f"Proxies frozen: {self._proxies_frozen}. Proxies: {self.proxies}")
-            while self._tries < self.retry_config.max_tries:
-                r = self.try_super_request_and_handle_exceptions()
-                self._tries += 1
-                success = (
-                    self.retry_config.is_successful_response(r)
-                    if r is not None
-                    else False
-                )
-                if not self.retry_config.retry_on_failure or (success):
-                    return r
-                time.sleep(self.retry_config.backoff_seconds)
-            else:
-                print(
-                    f"Exhausted all tries. Last response status code: {r.status_code if r is not None else None}"
-                )
+            r = yield from self.request_without_providers(request_kwargs)
+        if r is not None and not settings["stream"]:
+            r = self.read_deferred_body(r)
 
+        if cache_key is not None and self.is_cacheable_response(r):
+            self.cache[cache_key] = r
         return r
 
+    def spawn_in_pool(self, processes: int | None = None) -> multiprocessing.pool.Pool:
+        """
+        Create a process pool in which every worker holds its own copy of this
+        session, available through :func:`get_worker_session`. Connections
+        and locks are rebuilt in each worker, so nothing is shared between
+        processes::
+
+            def fetch(url):
+                return get_worker_session().get(url).text
+
+            with session.spawn_in_pool(4) as pool:
+                pages = pool.map(fetch, urls)
+
+        :param processes: number of worker processes. Defaults to the CPU count.
+        """
+        return multiprocessing.Pool(
+            processes, initializer=_init_worker_session, initargs=(self,)
+        )
+
+    def request_many(
+        self, calls: list[tuple[str, str, dict]], max_workers: int = 16
+    ) -> list[Response | None | Exception]:
+        """
+        Send several requests concurrently. Each request retries through the
+        proxy providers on its own, exactly as :meth:`request` does, while the
+        others keep going. Workers only send requests: a request waiting out
+        a backoff is parked on a deadline heap and handed back to a worker
+        once it is due, so backoffs never hold a worker.
+        :param calls: (method, url, kwargs) for every request, where kwargs
+            are the optional arguments that :meth:`request` takes
+        :param max_workers: maximum number of requests in flight
+        :return: responses in the same order as calls. A request that raised
+            is returned as its exception instead of failing the others.
+        """
+        steps = []
+        for method, url, kwargs in calls:
+            unknown = kwargs.keys() - _REQUEST_DEFAULTS.keys() - {"use_cache"}
+            if unknown:
+                raise TypeError(
+                    f"Unexpected arguments for {method} {url}: {sorted(unknown)}"
+                )
+            kwargs = dict(kwargs)
+            use_cache = kwargs.pop("use_cache", True)
+            request_kwargs = {
+                **_REQUEST_DEFAULTS,
+                **kwargs,
+                "method": method,
+                "url": url,
+            }
+            steps.append(self.request_steps(request_kwargs, use_cache))
+        responses: list[Response | None | Exception] = [None] * len(steps)
+        # (deadline, index) of the requests waiting out a backoff
+        pending: list[tuple[float, int]] = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {
+                executor.submit(_advance, request_steps): index
+                for index, request_steps in enumerate(steps)
+            }
+            while running or pending:
+                now = time.monotonic()
+                while pending and pending[0][0] <= now:
+                    _, index = heapq.heappop(pending)
+                    running[executor.submit(_advance, steps[index])] = index
+                timeout = pending[0][0] - now if pending else None
+                if not running:
+                    time.sleep(timeout)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        finished, value = future.result()
+                    except Exception as e:
+                        responses[index] = e
+                        continue
+                    if finished:
+                        responses[index] = value
+                    else:
+                        heapq.heappush(pending, (time.monotonic() + value, index))
+        return responses
+
     def get(self, url, **kwargs):
         return self.request("get", url, **kwargs)
 
@@ -272,3 +930,36 @@ class Session(requests.Session):
 
     def __exit__(self, *args):
         self.close()
+
+    def __getstate__(self):
+        # requests.Session only pickles its own attributes, which would drop
+        # the proxy and retry configs. Connections and locks are rebuilt on
+        # unpickling rather than copied.
+        state = self.__dict__.copy()
+        del state["adapters"]
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self.reset_adapters()
+
+
+_worker_session: Session | None = None
+
+
+def _init_worker_session(session: Session):
+    global _worker_session
+    # Under fork the session arrives as a memory copy rather than unpickled,
+    # so pooled connections and locks of the parent are replaced explicitly
+    session._lock = threading.Lock()
+    session.reset_adapters()
+    _worker_session = session
+
+
+def get_worker_session() -> Session:
+    """The session of the current worker of a :meth:`Session.spawn_in_pool` pool."""
+    if _worker_session is None:
+        raise RuntimeError("Not running in a pool created by Session.spawn_in_pool")
+    return _worker_session